@@ -0,0 +1,122 @@
+# admission.py (Admission control / load shedding in front of the DB connection pool)
+import time
+import threading
+
+
+class Overloaded(Exception):
+    """Raised when a request could not be admitted within its class's wait budget."""
+
+    def __init__(self, request_class, retry_after):
+        super().__init__(f"{request_class} requests are being shed")
+        self.request_class = request_class
+        self.retry_after = retry_after
+
+
+class RequestClass:
+    """Budget for one class of requests: higher priority is admitted first."""
+
+    def __init__(self, name, priority, limit, max_wait, retry_after=1):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds how many requests may hold (or wait for) a pooled DB connection.
+
+    Each request class has its own concurrency limit and maximum wait; all classes
+    share `capacity` slots (normally the pool size). A waiting request is only
+    admitted when no higher-priority class is also waiting, so auth and writes
+    overtake polling. Requests that can't get a slot in time raise Overloaded.
+
+    Usage:
+        with controller.slot("polling"):
+            ...
+    """
+
+    def __init__(self, capacity, classes):
+        self.capacity = capacity
+        self.classes = {c.name: c for c in classes}
+        self._cond = threading.Condition()
+        self._total = 0
+        self._in_use = {name: 0 for name in self.classes}
+        self._waiting = {name: 0 for name in self.classes}
+        self._admitted = {name: 0 for name in self.classes}
+        self._shed = {name: 0 for name in self.classes}
+
+    def _can_admit(self, rc):
+        if self._total >= self.capacity or self._in_use[rc.name] >= rc.limit:
+            return False
+        # let higher-priority waiters go first
+        return not any(
+            self._waiting[other.name] and other.priority > rc.priority
+            and self._in_use[other.name] < other.limit
+            for other in self.classes.values()
+        )
+
+    def acquire(self, name):
+        rc = self.classes[name]
+        deadline = time.monotonic() + rc.max_wait
+        with self._cond:
+            self._waiting[name] += 1
+            try:
+                while not self._can_admit(rc):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._shed[name] += 1
+                        raise Overloaded(name, rc.retry_after)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[name] -= 1
+            self._in_use[name] += 1
+            self._total += 1
+            self._admitted[name] += 1
+
+    def release(self, name):
+        with self._cond:
+            self._in_use[name] -= 1
+            self._total -= 1
+            self._cond.notify_all()
+
+    def slot(self, name):
+        controller = self
+
+        class _Slot:
+            def __enter__(self):
+                controller.acquire(name)
+                return self
+
+            def __exit__(self, exc_type, exc, tb):
+                controller.release(name)
+
+        return _Slot()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "in_use": self._total,
+                "classes": {
+                    name: {
+                        "limit": rc.limit,
+                        "in_use": self._in_use[name],
+                        "waiting": self._waiting[name],
+                        "admitted": self._admitted[name],
+                        "shed": self._shed[name],
+                    }
+                    for name, rc in self.classes.items()
+                },
+            }
+
+
+def default_classes(capacity):
+    """Budgets derived from the pool size: polling can never take more than a third of it."""
+    return [
+        RequestClass("auth", priority=3, limit=capacity, max_wait=3.0, retry_after=2),
+        RequestClass("write", priority=2, limit=capacity, max_wait=2.0, retry_after=2),
+        RequestClass("interactive", priority=1, limit=max(1, capacity - 1), max_wait=1.0, retry_after=2),
+        RequestClass("polling", priority=0, limit=max(1, capacity // 3), max_wait=0.02, retry_after=1),
+    ]
@@ -0,0 +1,205 @@
+# anomaly.py (Rolling-statistics anomaly detection for sensor readings)
+import math
+
+import numpy as np
+
+# -------------------------
+# Metric configuration
+# -------------------------
+# table -> {metric column: max rate of change per second (None = z-score only)}
+METRICS = {
+    "sensordata": {"temperature": 0.2, "humidity": 1.0, "ammonia": 2.0},
+    "sensordata3": {"weight": None},
+}
+
+DEFAULT_WINDOW = 300
+DEFAULT_Z = 4.0
+DEFAULT_ALPHA = 0.1
+MIN_SAMPLES = 30
+# readings closer together than this are compared as if this far apart, so a batch
+# stamped microseconds apart doesn't turn sensor jitter into a huge rate
+MIN_RATE_INTERVAL = 1.0
+
+
+class RollingStats:
+    """
+    Fixed-size ring buffer of float64 samples with O(1) mean/variance and an EWMA.
+
+    The running sums are kept in float64 and recomputed from the buffer every
+    `window` pushes so floating-point drift can't accumulate.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, alpha=DEFAULT_ALPHA):
+        self.buf = np.zeros(window, dtype=np.float64)
+        self.window = window
+        self.alpha = alpha
+        self.count = 0
+        self.pos = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.ewma = None
+        self.last_value = None
+        self.last_ts = None
+
+    def push(self, value, ts=None):
+        if self.count == self.window:
+            old = self.buf[self.pos]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.buf[self.pos] = value
+        self.total += value
+        self.total_sq += value * value
+        self.pos = (self.pos + 1) % self.window
+        if self.pos == 0:
+            live = self.buf[:self.count]
+            self.total = float(live.sum())
+            self.total_sq = float(np.dot(live, live))
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+        self.last_value = value
+        self.last_ts = ts
+
+    def extend(self, values):
+        """Seed the buffer from an array of historical values (oldest first)."""
+        for v in np.asarray(values, dtype=np.float64)[-self.window:]:
+            if math.isfinite(v):
+                self.push(float(v))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        var = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class AnomalyDetector:
+    """
+    Keeps RollingStats per (table, metric) and flags readings that are z-score
+    outliers against the trailing window, or whose EWMA-smoothed value changes
+    faster than the metric's max rate.
+
+    Usage:
+        detector = AnomalyDetector()
+        for metric, message in detector.observe("sensordata", row, ts): ...
+    """
+
+    def __init__(self, metrics=METRICS, window=DEFAULT_WINDOW, z_threshold=DEFAULT_Z, alpha=DEFAULT_ALPHA):
+        self.metrics = metrics
+        self.z_threshold = z_threshold
+        self.stats = {
+            (table, metric): RollingStats(window, alpha)
+            for table, cols in metrics.items() for metric in cols
+        }
+
+    def seed(self, table, metric, values):
+        self.stats[(table, metric)].extend(values)
+
+    def observe(self, table, row, ts):
+        """Score one reading (ts as epoch seconds) and return a list of (metric, message)."""
+        messages = []
+        for metric, max_rate in self.metrics.get(table, {}).items():
+            value = row.get(metric)
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if not math.isfinite(value):
+                continue
+            st = self.stats[(table, metric)]
+            if st.count >= MIN_SAMPLES:
+                std = st.std
+                if std > 0:
+                    z = (value - st.mean) / std
+                    if abs(z) >= self.z_threshold:
+                        msg = f"Anomaly: {metric} {value:g} deviates from recent mean {st.mean:.2f} (z={z:+.1f})"
+                        messages.append((metric, msg))
+            if max_rate is not None and st.last_ts is not None and ts >= st.last_ts:
+                # rate of the EWMA-smoothed value, so sensor noise between readings doesn't count
+                smoothed = st.alpha * value + (1 - st.alpha) * st.ewma
+                rate = (smoothed - st.ewma) / max(ts - st.last_ts, MIN_RATE_INTERVAL)
+                if abs(rate) > max_rate:
+                    msg = f"Anomaly: {metric} trend changed {smoothed - st.ewma:+.2f} in {ts - st.last_ts:.1f}s"
+                    messages.append((metric, msg))
+            st.push(value, ts)
+        return messages
+
+
+def ewma(values, alpha=DEFAULT_ALPHA, chunk=128):
+    """
+    EWMA of a 1-D array seeded with its first value, matching RollingStats.push.
+
+    Solved in closed form per `chunk` samples (short enough that (1 - alpha)**-k
+    stays well inside float64), carrying the last value into the next chunk.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if not values.size:
+        return out
+    decay = 1.0 - alpha
+    powers = decay ** np.arange(chunk)
+    state = values[0]
+    for start in range(0, values.size, chunk):
+        x = values[start:start + chunk]
+        p = powers[:x.size]
+        # e_j = decay^(j+1) * state + alpha * sum_k<=j decay^(j-k) x_k
+        out[start:start + x.size] = decay * p * state + alpha * p * np.cumsum(x / p)
+        state = out[start + x.size - 1]
+    return out
+
+
+def score_series(values, timestamps, window=DEFAULT_WINDOW, z_threshold=DEFAULT_Z, max_rate=None,
+                 alpha=DEFAULT_ALPHA):
+    """
+    Vectorized equivalent of AnomalyDetector.observe over a whole history.
+
+    values, timestamps: 1-D arrays (timestamps in epoch seconds), oldest first.
+    Returns (z_flags, rate_flags, z) where each reading is scored against the
+    `window` readings before it, exactly like the streaming detector.
+    NaN values are ignored for the statistics and never flagged.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    n = values.size
+    z = np.zeros(n)
+    if n == 0:
+        return np.zeros(0, bool), np.zeros(0, bool), z
+
+    valid = np.isfinite(values)
+    if not valid.any():
+        return np.zeros(n, bool), np.zeros(n, bool), z
+    v = np.where(valid, values, 0.0)
+    # prefix sums with a leading zero: sums over the trailing window of *valid* samples
+    c_val = np.concatenate(([0.0], np.cumsum(v)))
+    c_sq = np.concatenate(([0.0], np.cumsum(v * v)))
+    c_cnt = np.concatenate(([0], np.cumsum(valid)))
+
+    # index of the first sample in each reading's trailing window of `window` valid samples
+    idx = np.arange(n)
+    valid_idx = np.flatnonzero(valid)
+    prior = c_cnt[:-1]  # valid samples strictly before i
+    start_rank = np.minimum(np.maximum(prior - window, 0), valid_idx.size - 1)
+    start = np.minimum(valid_idx[start_rank], idx)
+
+    cnt = (c_cnt[idx] - c_cnt[start]).astype(np.float64)
+    s = c_val[idx] - c_val[start]
+    sq = c_sq[idx] - c_sq[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / cnt
+        var = (sq - s * s / cnt) / (cnt - 1)
+        std = np.sqrt(np.clip(var, 0, None))
+        z = np.where((cnt >= MIN_SAMPLES) & (std > 0) & valid, (values - mean) / std, 0.0)
+    z_flags = np.abs(z) >= z_threshold
+
+    rate_flags = np.zeros(n, dtype=bool)
+    if max_rate is not None and valid_idx.size > 1:
+        dv = np.diff(ewma(values[valid_idx], alpha))
+        dt = np.diff(timestamps[valid_idx])
+        rate = np.where(dt >= 0, dv / np.maximum(dt, MIN_RATE_INTERVAL), 0.0)
+        rate_flags[valid_idx[1:]] = np.abs(rate) > max_rate
+    return z_flags, rate_flags, z
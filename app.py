@@ -1,17 +1,34 @@
 # app.py (Combined Frontend/DB routes, uses Postgres Pool, AI/Hardware code removed)
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, has_request_context
 from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from contextlib import contextmanager, nullcontext
 import os
+import fcntl
+import bisect
 import logging
 import datetime
+import hashlib
+import hmac
+import tempfile
+import threading
+import time
 
 import psycopg
-from psycopg.rows import dict_row
+from psycopg.rows import dict_row, tuple_row
+from psycopg import sql
 import psycopg.errors as pg_errors
 
+from dbpool import PoolManager
+from spool import Spool, SpoolReplayer
+from admission import AdmissionController, Overloaded, default_classes
+from wire import fetch_columnar
+from reports import ReportJobs, normalize_spec, invalidate_artifacts
+from anomaly import AnomalyDetector, METRICS as ANOMALY_METRICS, score_series
+import numpy as np
+
 # connection pool from psycopg_pool
 try:
     from psycopg_pool import ConnectionPool
@@ -47,33 +64,98 @@ DB_URL = DB_URL_RAW.replace("postgres://", "postgresql://", 1) if DB_URL_RAW.sta
 # -------------------------
 # Database connection pool (psycopg_pool)
 # -------------------------
-POOL_MAX = int(os.environ.get("DB_POOL_MAX", 6))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 8))
+POOL_MIN = min(int(os.environ.get("DB_POOL_MIN", 2)), POOL_MAX)
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", 300))
+POOL_WARMUP_TIMEOUT = float(os.environ.get("DB_POOL_WARMUP_TIMEOUT", 10))
+
+# Statement timeouts (ms) per request class, so one slow query can't pin a connection
+STATEMENT_TIMEOUTS = {
+    "auth": 5000,
+    "write": 15000,
+    "interactive": 10000,
+    "polling": 3000,
+}
+# endpoints that are expected to run long
+ENDPOINT_STATEMENT_TIMEOUTS = {
+    "anomalies_rescore": 300000,
+    "upload_snapshot": STATEMENT_TIMEOUTS["write"],
+}
+# background threads (spool replay, report jobs, anomaly tailer, startup)
+BACKGROUND_STATEMENT_TIMEOUT = int(os.environ.get("DB_BACKGROUND_STATEMENT_TIMEOUT_MS", 120000))
+# session default set once per connection; get_conn only overrides it (transaction-locally)
+# for other classes, so the most frequent requests - dashboard polling - skip the round trip
+CONNECTION_STATEMENT_TIMEOUT = STATEMENT_TIMEOUTS["polling"]
+
+def configure_connection(conn):
+    conn.execute("SELECT set_config('statement_timeout', %s, false)", (str(CONNECTION_STATEMENT_TIMEOUT),))
+    conn.commit()
 
 if ConnectionPool is None:
     app.logger.warning("psycopg_pool not available. Falling back to direct connections (no pool).")
     pool = None
 else:
     try:
-        # ** FIX **: Added row_factory=dict_row to the pool
-        pool = ConnectionPool(conninfo=DB_URL, max_size=POOL_MAX, row_factory=dict_row)
-        app.logger.info("Postgres connection pool created (max_size=%s).", POOL_MAX)
+        # row_factory has to go through kwargs: it is a connection option, not a pool one
+        pool = ConnectionPool(
+            conninfo=DB_URL,
+            min_size=POOL_MIN,
+            max_size=POOL_MAX,
+            kwargs={"row_factory": dict_row},
+            configure=configure_connection,
+            timeout=POOL_TIMEOUT,
+            max_idle=POOL_MAX_IDLE,
+            name="chickcare",
+            open=True
+        )
+        app.logger.info("Postgres connection pool created (min_size=%s, max_size=%s).", POOL_MIN, POOL_MAX)
     except Exception:
         app.logger.exception("Failed to create Postgres connection pool; falling back to None.")
         pool = None
 
-# Helper to obtain a connection context manager (works with pool or raw psycopg.connect)
-def get_conn():
-    """
-    Usage:
-        with get_conn() as conn, conn.cursor() as cur:
-            ...
-    """
+# Pre-warm min_size connections so the first requests after a deploy don't pay for connecting.
+# (Not pool.wait(): on timeout it closes the pool, and a closed pool never recovers.)
+def warm_up_pool(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pool.get_stats().get("pool_available", 0) >= POOL_MIN:
+            return True
+        time.sleep(0.1)
+    return False
+
+if pool:
+    if warm_up_pool(POOL_WARMUP_TIMEOUT):
+        app.logger.info("Postgres connection pool warmed up (%s connections).", POOL_MIN)
+    else:
+        app.logger.warning("Pool warm-up timed out after %ss; the pool keeps retrying in the background.",
+                           POOL_WARMUP_TIMEOUT)
+
+    pool_manager = PoolManager(
+        pool, min_floor=POOL_MIN, max_size=POOL_MAX,
+        interval=float(os.environ.get("DB_POOL_TUNE_INTERVAL", 10)),
+        check_interval=float(os.environ.get("DB_POOL_CHECK_INTERVAL", 30))
+    )
+    pool_manager.start()
+else:
+    pool_manager = None
+
+def current_statement_timeout():
+    if not has_request_context():
+        return BACKGROUND_STATEMENT_TIMEOUT
+    if request.endpoint in ENDPOINT_STATEMENT_TIMEOUTS:
+        return ENDPOINT_STATEMENT_TIMEOUTS[request.endpoint]
+    return STATEMENT_TIMEOUTS.get(g.get("admission_class"), STATEMENT_TIMEOUTS["interactive"])
+
+def _raw_conn(timeout=None):
     if pool:
-        return pool.connection()
+        return pool.connection(timeout=timeout)
     # fallback: provide a context manager that yields a direct connection
     class _DirectConnCtx:
         def __enter__(self):
-            self.conn = psycopg.connect(DB_URL, row_factory=dict_row)
+            extra = {"connect_timeout": max(1, int(timeout))} if timeout else {}
+            self.conn = psycopg.connect(DB_URL, row_factory=dict_row, **extra)
+            configure_connection(self.conn)
             return self.conn
         def __exit__(self, exc_type, exc, tb):
             try:
@@ -85,6 +167,90 @@ def get_conn():
                 self.conn.close()
     return _DirectConnCtx()
 
+# Connections reserved for background threads (spool replay, report jobs, anomaly tailer, startup work).
+# Requests are admitted against the rest of the pool, so background work can never
+# take connections the admission budgets were counting on.
+BACKGROUND_CONNECTIONS = max(1, min(int(os.environ.get("DB_BACKGROUND_CONNECTIONS", 2)), POOL_MAX - 1))
+background_slots = threading.BoundedSemaphore(BACKGROUND_CONNECTIONS)
+
+@contextmanager
+def _background_slot(timeout=None):
+    if not background_slots.acquire(timeout=timeout):
+        raise psycopg.OperationalError("no background database slot free")
+    try:
+        yield
+    finally:
+        background_slots.release()
+
+# Helper to obtain a connection context manager (works with pool or raw psycopg.connect)
+@contextmanager
+def get_conn(timeout=None, background_slot=True):
+    """
+    Usage:
+        with get_conn() as conn, conn.cursor() as cur:
+            ...
+    timeout (seconds) bounds the wait for a pooled connection / connect attempt.
+    The transaction gets the statement_timeout of the current route class.
+    Outside a request, the caller first waits for one of BACKGROUND_CONNECTIONS slots;
+    background code must not nest get_conn() calls. background_slot=False skips the
+    wait, for short bookkeeping that must not queue behind long background work.
+    """
+    reserved = background_slot and not has_request_context()
+    slot = _background_slot(timeout) if reserved else nullcontext()
+    with slot, _raw_conn(timeout) as conn:
+        statement_timeout = current_statement_timeout()
+        if statement_timeout != CONNECTION_STATEMENT_TIMEOUT:
+            # transaction-local (is_local=true), so it never leaks to the next borrower
+            conn.execute("SELECT set_config('statement_timeout', %s, true)", (str(statement_timeout),))
+        yield conn
+
+# -------------------------
+# Admission control (per-endpoint budgets in front of the pool, see admission.py)
+# -------------------------
+REQUEST_CONNECTIONS = max(1, POOL_MAX - BACKGROUND_CONNECTIONS)
+admission = AdmissionController(REQUEST_CONNECTIONS, default_classes(REQUEST_CONNECTIONS))
+
+# endpoint -> request class; POSTs default to "write", other DB pages to "interactive"
+ADMISSION_CLASSES = {
+    "login": "auth",
+    "register": "auth",
+    "generate": "auth",
+    "reset_with_token": "auth",
+    "fetch_all_data1": "polling",
+    "fetch_all_data2": "polling",
+    "fetch_all_data3": "polling",
+    "fetch_all_data4": "polling",
+    "fetch_all_data5": "polling",
+    "fetch_all_data6": "polling",
+    "fetch_all_data7": "polling",
+    "get_image_list": "polling",
+    "report_job_status": "polling",
+}
+# endpoints that never touch the database, or take a slot only around their DB step
+# (upload_snapshot: a slow 20 MB upload must not hold a slot /login could use)
+ADMISSION_EXEMPT = {"static", "home", "logout", "sanitization", "report", "main_dashboard", "admission_stats", "pool_stats",
+                    "upload_snapshot"}
+
+@app.before_request
+def admit_request():
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in ADMISSION_EXEMPT:
+        return None
+    request_class = ADMISSION_CLASSES.get(endpoint) or ("write" if request.method == "POST" else "interactive")
+    try:
+        admission.acquire(request_class)
+    except Overloaded as e:
+        app.logger.warning("Shedding %s request to %s", e.request_class, endpoint)
+        return jsonify({'error': 'Server busy, please retry.'}), 503, {"Retry-After": str(e.retry_after)}
+    g.admission_class = request_class
+    return None
+
+@app.teardown_request
+def release_admission(exc):
+    request_class = g.pop("admission_class", None)
+    if request_class:
+        admission.release(request_class)
+
 # -------------------------
 # Flask-Mail Setup
 # -------------------------
@@ -202,12 +368,204 @@ def init_tables():
                     DateTime TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
                 )
             """)
+            # Replay position of each local reading spool (see spool.py)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS spool_checkpoint (
+                    spool_id VARCHAR(64) PRIMARY KEY,
+                    last_seq BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+                )
+            """)
+            # Spooled readings Postgres rejected during replay, kept for inspection
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS spool_quarantine (
+                    id SERIAL PRIMARY KEY,
+                    spool_id VARCHAR(64) NOT NULL,
+                    seq BIGINT NOT NULL,
+                    table_name VARCHAR(64) NOT NULL,
+                    reading JSONB NOT NULL,
+                    error TEXT,
+                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+                )
+            """)
+            # Camera snapshot metadata; files live under static/shots/YYYY/MM/DD/<sha256>.<ext>
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id SERIAL PRIMARY KEY,
+                    camera_id VARCHAR(64) NOT NULL DEFAULT 'default',
+                    taken_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+                    size_bytes BIGINT NOT NULL,
+                    sha256 CHAR(64) UNIQUE NOT NULL,
+                    path TEXT NOT NULL
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS snapshots_taken_at_idx ON snapshots (taken_at)")
+            cur.execute("CREATE INDEX IF NOT EXISTS snapshots_camera_taken_at_idx ON snapshots (camera_id, taken_at)")
+            # Report jobs and their cached results (see reports.py)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    id SERIAL PRIMARY KEY,
+                    spec_hash CHAR(64) NOT NULL,
+                    spec JSONB NOT NULL,
+                    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+                    error TEXT,
+                    submitted_by INTEGER,
+                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+                    started_at TIMESTAMP WITHOUT TIME ZONE,
+                    finished_at TIMESTAMP WITHOUT TIME ZONE,
+                    worker_id VARCHAR(128),
+                    heartbeat_at TIMESTAMP WITHOUT TIME ZONE
+                )
+            """)
+            cur.execute("""
+                ALTER TABLE report_jobs
+                    ADD COLUMN IF NOT EXISTS worker_id VARCHAR(128),
+                    ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITHOUT TIME ZONE
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS report_jobs_spec_hash_idx ON report_jobs (spec_hash)")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS report_artifacts (
+                    spec_hash CHAR(64) PRIMARY KEY,
+                    spec JSONB NOT NULL,
+                    result JSONB NOT NULL,
+                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+                )
+            """)
     except Exception:
         app.logger.exception("init_tables: failed to ensure tables")
 
 # run once on startup (safe: CREATE IF NOT EXISTS)
 init_tables()
 
+# -------------------------
+# Camera snapshots
+# -------------------------
+SHOTS_DIR = os.path.join(app.static_folder, "shots")
+SNAPSHOT_MAX_BYTES = int(os.environ.get("SNAPSHOT_MAX_BYTES", 20 * 1024 * 1024))
+SNAPSHOT_CHUNK = 64 * 1024
+
+# leading bytes -> file extension
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+# Cameras that still drop flat files into static/shots are picked up at startup and,
+# at most every LEGACY_SHOTS_RESCAN seconds, when /get_image_list is requested
+LEGACY_SHOTS_RESCAN = float(os.environ.get("LEGACY_SHOTS_RESCAN", 30))
+legacy_shots_lock = threading.Lock()
+legacy_shots_seen = set()  # flat file names already indexed (or duplicates of an indexed frame)
+legacy_shots_scanned = 0.0
+
+def import_legacy_shots():
+    """Index new flat static/shots/shot_YYYYMMDD_HHMMSS.* files into the snapshots table (in place)."""
+    global legacy_shots_scanned
+    if not os.path.isdir(SHOTS_DIR) or not legacy_shots_lock.acquire(blocking=False):
+        return
+    try:
+        legacy_shots_scanned = time.monotonic()
+        names = {
+            e.name for e in os.scandir(SHOTS_DIR)
+            if e.is_file() and e.name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
+        } - legacy_shots_seen
+        if not names:
+            return
+        with get_conn() as conn, conn.cursor() as cur:
+            # only hash files whose name isn't indexed yet
+            cur.execute("SELECT path FROM snapshots WHERE path = ANY(%s)", (list(names),))
+            indexed = {r["path"] for r in cur.fetchall()}
+            for name in sorted(names - indexed):
+                full = os.path.join(SHOTS_DIR, name)
+                try:
+                    taken_at = datetime.datetime.strptime(os.path.splitext(name)[0], "shot_%Y%m%d_%H%M%S")
+                except ValueError:
+                    taken_at = datetime.datetime.fromtimestamp(os.path.getmtime(full))
+                digest = hashlib.sha256()
+                with open(full, "rb") as f:
+                    for chunk in iter(lambda: f.read(SNAPSHOT_CHUNK), b""):
+                        digest.update(chunk)
+                cur.execute(
+                    """
+                    INSERT INTO snapshots (taken_at, size_bytes, sha256, path)
+                    VALUES (%s, %s, %s, %s) ON CONFLICT (sha256) DO NOTHING
+                    """,
+                    (taken_at, os.path.getsize(full), digest.hexdigest(), name)
+                )
+        legacy_shots_seen.update(names)
+    except Exception:
+        app.logger.exception("import_legacy_shots: failed to index existing snapshots")
+    finally:
+        legacy_shots_lock.release()
+
+import_legacy_shots()
+
+# -------------------------
+# Report jobs
+# -------------------------
+# leave at least one background slot to spool replay and the anomaly tailer
+REPORT_WORKERS = max(1, min(int(os.environ.get("REPORT_WORKERS", 2)), BACKGROUND_CONNECTIONS - 1))
+
+report_jobs = ReportJobs(
+    get_conn,
+    workers=REPORT_WORKERS,
+    # heartbeats are one-row updates and must not wait behind the jobs they vouch for
+    heartbeat_conn=lambda: get_conn(background_slot=False),
+    partial_ttl=int(os.environ.get("REPORT_PARTIAL_TTL", 300))
+)
+# jobs left queued/running by a worker that has since stopped are failed, not joined
+try:
+    stale_jobs = report_jobs.expire_stale()
+    if stale_jobs:
+        app.logger.info("Marked %s interrupted report job(s) as failed.", stale_jobs)
+except Exception:
+    app.logger.exception("Failed to expire stale report jobs")
+
+# -------------------------
+# Reading spool (readings are kept on local disk while Postgres is unreachable)
+# -------------------------
+SPOOL_DIR = os.environ.get("SPOOL_DIR", os.path.join(app.root_path, "spool"))
+SPOOL_BATCH = int(os.environ.get("SPOOL_BATCH", 5000))
+INGEST_DB_TIMEOUT = float(os.environ.get("INGEST_DB_TIMEOUT", 2))
+INGEST_TOKEN = os.environ.get("INGEST_TOKEN")
+if not INGEST_TOKEN:
+    app.logger.warning("INGEST_TOKEN is not set; /ingest and /snapshots will refuse all devices.")
+
+# Columns accepted per sensor table on the ingest path (also used for COPY replay)
+INGEST_TABLES = {
+    "sensordata": ("datetime", "humidity", "temperature", "ammonia", "light1", "light2", "exhaustfan"),
+    "sensordata1": ("datetime", "food", "water"),
+    "sensordata2": ("datetime", "conveyor", "sprinkle", "uvlight"),
+    "sensordata3": ("datetime", "chicknumber", "weight", "weighingcount", "averageweight"),
+    "sensordata4": ("datetime", "water_level", "food_level"),
+}
+
+def invalidate_replayed_reports(cur, batch):
+    """Replayed readings keep their original (past) time, so cached reports covering it are stale."""
+    days = set()
+    for _, _, row in batch:
+        try:
+            days.add(datetime.datetime.fromisoformat(str(row.get("datetime"))).date())
+        except ValueError:
+            continue
+    if days:
+        dropped = invalidate_artifacts(cur, min(days), max(days))
+        if dropped:
+            app.logger.info("Spool replay invalidated %s cached report(s) for %s..%s", dropped, min(days), max(days))
+
+try:
+    spool = Spool.acquire(SPOOL_DIR)
+    spool_replayer = SpoolReplayer(
+        spool, get_conn, INGEST_TABLES, batch_size=SPOOL_BATCH, on_replayed=invalidate_replayed_reports
+    )
+    spool_replayer.start()
+    app.logger.info("Reading spool ready at %s (spool_id=%s).", spool.directory, spool.spool_id)
+except Exception:
+    app.logger.exception("Failed to open reading spool; readings will not be buffered locally.")
+    spool = None
+    spool_replayer = None
+
 # -------------------------
 # Utilities
 # -------------------------
@@ -250,18 +608,38 @@ def normalize_env_records(rows):
         out.append(record)
     return out
 
+DELTA_MAX_ROWS = int(os.environ.get("DELTA_MAX_ROWS", 1000))
+
+def fetch_delta(cur, table, columns, since, window):
+    """
+    Rows of `table` for a since=<id> cursor, oldest first, via the primary key index.
+    since <= 0 bootstraps with the last `window` rows; otherwise only rows with
+    id > since are returned (at most DELTA_MAX_ROWS). Returns (rows, cursor).
+    """
+    cols = sql.SQL(", ").join(sql.Identifier(c) for c in ("id", *columns))
+    if since <= 0:
+        cur.execute(
+            sql.SQL("SELECT {} FROM {} ORDER BY id DESC LIMIT %s").format(cols, sql.Identifier(table)),
+            (window,)
+        )
+        rows = cur.fetchall()[::-1]
+    else:
+        cur.execute(
+            sql.SQL("SELECT {} FROM {} WHERE id > %s ORDER BY id LIMIT %s").format(cols, sql.Identifier(table)),
+            (since, DELTA_MAX_ROWS)
+        )
+        rows = cur.fetchall()
+    cursor = rows[-1]["id"] if rows else max(since, 0)
+    return rows, cursor
+
 def get_growth_chart_data(limit=20):
     """Return dates and weights from sensordata3 for the growth chart."""
     dates = []
     weights = []
     try:
         with get_conn() as conn, conn.cursor() as cur:
-            # Use postgres-style %s placeholders
-            cur.execute("SELECT datetime, weight FROM sensordata3 ORDER BY id DESC LIMIT %s", (limit,))
-            rows = cur.fetchall()
-            rows = list(reversed(rows))
-            for r in rows:
-                rec = dict(r)
+            rows, _ = fetch_delta(cur, "sensordata3", ("datetime", "weight"), 0, limit)
+            for rec in rows:
                 dt = rec.get("datetime")
                 if isinstance(dt, datetime.datetime):
                     label = dt.strftime("%Y-%m-%d %H:%M")
@@ -273,6 +651,190 @@ def get_growth_chart_data(limit=20):
         app.logger.exception("get_growth_chart_data failed")
     return dates, weights
 
+def ingest_reading(table, reading):
+    """
+    Store one sensor reading, spooling it to local disk if Postgres is unavailable.
+    Returns "stored" or "spooled"; invalid readings raise ValueError or a psycopg
+    DataError/IntegrityError/ProgrammingError and are never spooled.
+    """
+    columns = INGEST_TABLES[table]
+    row = {c: reading[c] for c in columns if reading.get(c) is not None}
+    for c, v in row.items():
+        if not isinstance(v, (str, int, float)):
+            raise ValueError(f"{c}: expected a string or number")
+    # stamp at ingest time so a replayed reading keeps its original time
+    row.setdefault("datetime", datetime.datetime.now().isoformat(sep=" ", timespec="microseconds"))
+
+    # while a backlog exists, keep appending so replay preserves arrival order
+    if spool and spool.pending():
+        spool.append(table, row)
+        spool_replayer.wake()
+        return "spooled"
+    try:
+        cols = list(row)
+        with get_conn(timeout=INGEST_DB_TIMEOUT) as conn, conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+                    sql.Identifier(table),
+                    sql.SQL(", ").join(sql.Identifier(c) for c in cols),
+                    sql.SQL(", ").join(sql.Placeholder() * len(cols))
+                ),
+                [row[c] for c in cols]
+            )
+        return "stored"
+    except psycopg.OperationalError:
+        # connectivity only (PoolTimeout/PoolClosed subclass it); bad data raises DataError etc.
+        if not spool:
+            raise
+        app.logger.warning("ingest_reading: database unavailable, spooling %s reading", table)
+        spool.append(table, row)
+        return "spooled"
+
+# -------------------------
+# Anomaly detection (rolling statistics per metric, see anomaly.py)
+# -------------------------
+ANOMALY_WINDOW = int(os.environ.get("ANOMALY_WINDOW", 300))
+ANOMALY_Z = float(os.environ.get("ANOMALY_Z", 4.0))
+ANOMALY_COOLDOWN = float(os.environ.get("ANOMALY_COOLDOWN", 300))
+ANOMALY_POLL_INTERVAL = float(os.environ.get("ANOMALY_POLL_INTERVAL", 5))
+ANOMALY_LOCK_PATH = os.path.join(SPOOL_DIR, "anomaly.lock")
+
+anomaly_detector = AnomalyDetector(window=ANOMALY_WINDOW, z_threshold=ANOMALY_Z)
+anomaly_last_alert = {}  # (table, metric) -> reading time (epoch) of the last notification
+
+def rescore_history(days=30, record=False):
+    """
+    Re-score the last `days` of readings with the vectorized detector.
+    Returns ({"table.metric": anomaly count}, {"table.metric": notifications written}).
+    With record=True anomalies are written to notifications stamped with the reading's
+    time, at most one per metric per ANOMALY_COOLDOWN of reading time; anomalies within
+    the cooldown of a notification already recorded for the metric (by an earlier rescore
+    or by the live tailer) are skipped, so rescoring never duplicates them.
+    """
+    counts, recorded = {}, {}
+    with get_conn() as conn, conn.cursor(row_factory=tuple_row) as cur:
+        for table, metrics in ANOMALY_METRICS.items():
+            cols = list(metrics)
+            cur.execute(
+                sql.SQL(
+                    "SELECT EXTRACT(EPOCH FROM datetime)::float8, {} FROM {} "
+                    "WHERE datetime >= NOW() - make_interval(days => %s) ORDER BY id"
+                ).format(sql.SQL(", ").join(sql.Identifier(c) for c in cols), sql.Identifier(table)),
+                (days,)
+            )
+            data = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, len(cols) + 1)
+            ts = data[:, 0]
+            for i, (metric, max_rate) in enumerate(metrics.items(), start=1):
+                z_flags, rate_flags, z = score_series(
+                    data[:, i], ts, window=ANOMALY_WINDOW, z_threshold=ANOMALY_Z, max_rate=max_rate
+                )
+                hits = np.flatnonzero(z_flags | rate_flags)
+                key = f"{table}.{metric}"
+                counts[key] = int(hits.size)
+                if not record:
+                    continue
+                recorded[key] = 0
+                if not hits.size:
+                    continue
+                prefix = f"Anomaly (rescore): {metric} "
+                # epoch seconds of this metric's earlier notifications, rescored or from the
+                # live tailer (both stamped with the reading's time), sorted
+                cur.execute(
+                    "SELECT EXTRACT(EPOCH FROM DateTime)::float8 FROM notifications "
+                    "WHERE (starts_with(message, %s) OR starts_with(message, %s)) "
+                    "AND DateTime >= NOW() - make_interval(days => %s, secs => %s) "
+                    "ORDER BY 1",
+                    (prefix, f"Anomaly: {metric} ", days, ANOMALY_COOLDOWN)
+                )
+                written = [r[0] for r in cur.fetchall()]
+                cooldown = max(ANOMALY_COOLDOWN, 0.001)
+                rows = []
+                for j in hits:
+                    t = float(ts[j])
+                    k = bisect.bisect_left(written, t)
+                    if any(abs(t - written[n]) < cooldown for n in (k - 1, k) if 0 <= n < len(written)):
+                        continue
+                    written.insert(k, t)
+                    rows.append((f"{prefix}{data[j, i]:g} (z={z[j]:+.1f})", t))
+                if rows:
+                    # the epochs came from naive UTC-read timestamps, so convert back the same way
+                    cur.executemany(
+                        "INSERT INTO notifications (message, DateTime) VALUES (%s, to_timestamp(%s) AT TIME ZONE 'UTC')",
+                        rows
+                    )
+                recorded[key] = len(rows)
+    return counts, recorded
+
+def check_anomalies(table, row):
+    """Score one stored reading and write any anomalies (rate-limited per metric) to notifications."""
+    dt = row.get("datetime")
+    if not isinstance(dt, datetime.datetime):
+        try:
+            dt = datetime.datetime.fromisoformat(str(dt))
+        except ValueError:
+            dt = datetime.datetime.now()
+    ts = dt.timestamp()
+    messages = []
+    for metric, message in anomaly_detector.observe(table, row, ts):
+        last = anomaly_last_alert.get((table, metric))
+        if last is None or abs(ts - last) >= ANOMALY_COOLDOWN:
+            anomaly_last_alert[(table, metric)] = ts
+            messages.append(message)
+    if not messages:
+        return
+    try:
+        with get_conn(timeout=INGEST_DB_TIMEOUT) as conn, conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO notifications (message, DateTime) VALUES (%s, %s)", [(m, dt) for m in messages]
+            )
+    except Exception:
+        app.logger.warning("check_anomalies: could not record %s", messages)
+
+def tail_anomalies():
+    """
+    Feed every new row of the scored tables to the detector, in id order, however it
+    was written (device ingest, spool replay, direct inserts). Only one process per
+    host tails (flock on ANOMALY_LOCK_PATH), so the rolling windows see the whole
+    stream and each anomaly is notified once; a waiting worker takes over when the
+    holder exits.
+    """
+    os.makedirs(os.path.dirname(ANOMALY_LOCK_PATH), exist_ok=True)
+    lock_file = open(ANOMALY_LOCK_PATH, "a")
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except OSError:
+            time.sleep(ANOMALY_POLL_INTERVAL * 6)
+    app.logger.info("Anomaly detector tailing %s.", ", ".join(ANOMALY_METRICS))
+
+    cursors = {}
+    while True:
+        for table, metrics in ANOMALY_METRICS.items():
+            try:
+                while True:
+                    seeding = table not in cursors
+                    with get_conn() as conn, conn.cursor() as cur:
+                        rows, cursors[table] = fetch_delta(
+                            cur, table, ("datetime", *metrics), cursors.get(table, 0), ANOMALY_WINDOW
+                        )
+                    if seeding:
+                        # warm the rolling windows with the latest rows instead of scoring them
+                        for metric in metrics:
+                            anomaly_detector.seed(
+                                table, metric, [np.nan if r[metric] is None else r[metric] for r in rows]
+                            )
+                        break
+                    for row in rows:
+                        check_anomalies(table, row)
+                    if len(rows) < DELTA_MAX_ROWS:
+                        break
+            except Exception:
+                app.logger.warning("tail_anomalies: failed to read %s; will retry", table, exc_info=True)
+        time.sleep(ANOMALY_POLL_INTERVAL)
+
+threading.Thread(target=tail_anomalies, name="anomaly-tailer", daemon=True).start()
+
 # -------------------------
 # Decorators
 # -------------------------
@@ -680,6 +1242,58 @@ def sanitization():
 def report():
     return render_template("report.html")
 
+def report_job_json(job):
+    out = {
+        "id": job["id"],
+        "status": job["status"],
+        "spec": job["spec"],
+        "spec_hash": job["spec_hash"],
+        "error": job.get("error"),
+    }
+    if job["status"] == "done":
+        out["result_url"] = url_for("report_artifact", spec_hash=job["spec_hash"])
+    return out
+
+@app.route("/reports/jobs", methods=["POST"])
+@login_required
+def submit_report_job():
+    """Queue a report: {"period": "daily"|"weekly"|"monthly"} or {"start","end"}, optional "metrics", "farm"."""
+    raw = request.get_json(silent=True) or request.form.to_dict()
+    try:
+        spec = normalize_spec(raw)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        job = report_jobs.submit(spec, user_id=session.get("user_id"))
+    except Exception as e:
+        app.logger.exception("Error in /reports/jobs")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(report_job_json(job)), (200 if job["status"] == "done" else 202)
+
+@app.route("/reports/jobs/<int:job_id>")
+@login_required
+def report_job_status(job_id):
+    try:
+        job = report_jobs.get_job(job_id)
+    except Exception as e:
+        app.logger.exception("Error in /reports/jobs/<id>")
+        return jsonify({'error': str(e)}), 500
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(report_job_json(job))
+
+@app.route("/reports/artifacts/<spec_hash>")
+@login_required
+def report_artifact(spec_hash):
+    try:
+        result = report_jobs.get_artifact(spec_hash)
+    except Exception as e:
+        app.logger.exception("Error in /reports/artifacts/<hash>")
+        return jsonify({'error': str(e)}), 500
+    if result is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify(result), 200, {"Cache-Control": "private, max-age=300"}
+
 # -----------------------------------------------
 # Data Fetching API Routes (from Gist, converted to Postgres)
 # -----------------------------------------------
@@ -710,9 +1324,16 @@ def format_datetime_in_results(results, field_name="datetime"):
 @app.route('/get_all_data1')
 @app.route('/get_growth_data') # <-- FIXED: Alias for Growth Monitoring
 def fetch_all_data1():
-    """Fetches ChickNumber and Weight from sensordata3."""
+    """Fetches ChickNumber and Weight from sensordata3 (?since=<id> for delta sync, ?format=columnar)."""
     try:
         with get_conn() as conn, conn.cursor() as cur:
+            if request.args.get("format") == "columnar":
+                return jsonify(fetch_columnar(conn, "sensordata3", request.args.get("since", type=int), 10, DELTA_MAX_ROWS))
+            if "since" in request.args:
+                rows, cursor = fetch_delta(cur, "sensordata3", ("datetime", "chicknumber", "weight"),
+                                           request.args.get("since", 0, type=int), 10)
+                rows = format_datetime_in_results(rows, "datetime")
+                return jsonify({'rows': rows, 'cursor': cursor, 'more': len(rows) == DELTA_MAX_ROWS})
             cur.execute("SELECT DateTime, ChickNumber, Weight FROM sensordata3 ORDER BY DateTime DESC LIMIT 10")
             results = cur.fetchall()
             results = format_datetime_in_results(results, "datetime")
@@ -766,9 +1387,19 @@ def fetch_all_data4():
 @app.route('/get_all_data')        # <-- FIXED: Alias for general data
 @app.route('/data')                # <-- FIXED: Alias for report data
 def fetch_all_data5():
-    """Fetches Environment data from sensordata."""
+    """Fetches Environment data from sensordata (?since=<id> for delta sync, ?format=columnar)."""
     try:
         with get_conn() as conn, conn.cursor() as cur:
+            if request.args.get("format") == "columnar":
+                return jsonify(fetch_columnar(conn, "sensordata", request.args.get("since", type=int), 10, DELTA_MAX_ROWS))
+            if "since" in request.args:
+                rows, cursor = fetch_delta(
+                    cur, "sensordata",
+                    ("datetime", "humidity", "temperature", "ammonia", "light1", "light2", "exhaustfan"),
+                    request.args.get("since", 0, type=int), 10
+                )
+                rows = format_datetime_in_results(rows, "datetime")
+                return jsonify({'rows': rows, 'cursor': cursor, 'more': len(rows) == DELTA_MAX_ROWS})
             cur.execute("SELECT DateTime, Humidity, Temperature, Ammonia, Light1, Light2, ExhaustFan FROM sensordata ORDER BY DateTime DESC LIMIT 10")
             results = cur.fetchall()
             results = format_datetime_in_results(results, "datetime")
@@ -805,35 +1436,176 @@ def fetch_all_data7():
         app.logger.exception("Error in /get_all_data7")
         return jsonify({'error': str(e)}), 500
 
+def ingest_denied():
+    """
+    Device endpoints require X-Ingest-Token to match INGEST_TOKEN and are disabled
+    when no token is configured. Returns an error response, or None if allowed.
+    """
+    if not INGEST_TOKEN:
+        return jsonify({'error': 'Device ingest is disabled: INGEST_TOKEN is not configured'}), 503
+    if not hmac.compare_digest(request.headers.get("X-Ingest-Token", ""), INGEST_TOKEN):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+@app.route('/admission/stats')
+@role_required("admin","superadmin")
+def admission_stats():
+    """Admitted / shed counters per request class."""
+    return jsonify(admission.stats())
+
+@app.route('/pool/stats')
+@role_required("admin","superadmin")
+def pool_stats():
+    """Connection pool sizing and health telemetry."""
+    if not pool_manager:
+        return jsonify({'error': 'Connection pool not in use'}), 404
+    return jsonify(pool_manager.snapshot())
+
+@app.route('/anomalies/rescore', methods=['POST'])
+@role_required("admin","superadmin")
+def anomalies_rescore():
+    """Vectorized re-scoring of history; ?days=30&record=1 writes notifications."""
+    days = request.args.get("days", 30, type=int)
+    record = request.args.get("record", "0").lower() in ("1", "true", "yes")
+    started = time.perf_counter()
+    try:
+        counts, recorded = rescore_history(days=days, record=record)
+    except Exception as e:
+        app.logger.exception("Error in /anomalies/rescore")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'anomalies': counts, 'recorded': recorded, 'seconds': round(time.perf_counter() - started, 3)})
+
+@app.route('/ingest/<table>', methods=['POST'])
+def ingest(table):
+    """Accepts one reading (JSON object) or a list of readings for a sensor table."""
+    denied = ingest_denied()
+    if denied:
+        return denied
+    if table not in INGEST_TABLES:
+        return jsonify({'error': f'Unknown table: {table}'}), 404
+    payload = request.get_json(silent=True)
+    readings = payload if isinstance(payload, list) else [payload]
+    if not readings or not all(isinstance(r, dict) for r in readings):
+        return jsonify({'error': 'Expected a JSON object or list of objects'}), 400
+    statuses = []
+    try:
+        for r in readings:
+            statuses.append(ingest_reading(table, {k.lower(): v for k, v in r.items()}))
+    except (ValueError, psycopg.DataError, psycopg.IntegrityError, psycopg.ProgrammingError) as e:
+        spooled = statuses.count("spooled")
+        return jsonify({'error': f'Invalid reading #{len(statuses)}: {e}',
+                        'stored': len(statuses) - spooled, 'spooled': spooled}), 400
+    except Exception as e:
+        app.logger.exception("Error in /ingest")
+        return jsonify({'error': str(e)}), 500
+    spooled = statuses.count("spooled")
+    return jsonify({'stored': len(statuses) - spooled, 'spooled': spooled}), (202 if spooled else 201)
+
 # -----------------------------------------------
 # <-- ⭐️ FIX: Added missing route for growth.html image gallery
 # -----------------------------------------------
 @app.route("/get_image_list")
 @login_required 
 def get_image_list():
+    """Snapshot paths (relative to static/shots), oldest first, from the snapshots time index."""
+    limit = request.args.get("limit", 200, type=int)
+    camera_id = request.args.get("camera_id")
+    if time.monotonic() - legacy_shots_scanned >= LEGACY_SHOTS_RESCAN:
+        import_legacy_shots()
     try:
-        # Assumes 'shots' is a folder inside your 'static' folder
-        image_dir = os.path.join(app.static_folder, 'shots')
-        
-        if not os.path.exists(image_dir):
-            app.logger.warning(f"Image directory not found: {image_dir}")
-            return jsonify([])
-
-        # Get all files and filter for common image extensions
-        all_files = os.listdir(image_dir)
-        image_files = [
-            f for f in all_files 
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
-        ]
-        
-        # Sort them by name
-        image_files.sort() 
-        
+        with get_conn() as conn, conn.cursor() as cur:
+            if camera_id:
+                cur.execute(
+                    "SELECT path FROM snapshots WHERE camera_id=%s ORDER BY taken_at DESC LIMIT %s",
+                    (camera_id, limit)
+                )
+            else:
+                cur.execute("SELECT path FROM snapshots ORDER BY taken_at DESC LIMIT %s", (limit,))
+            image_files = [r["path"] for r in reversed(cur.fetchall())]
         return jsonify(image_files)
     except Exception as e:
         app.logger.exception("Error in /get_image_list")
         return jsonify({'error': str(e)}), 500
 
+@app.route("/snapshots", methods=["POST"])
+def upload_snapshot():
+    """
+    Streams a raw image body (Content-Type image/*) to disk.
+    Optional: ?camera_id=...&taken_at=ISO8601 (defaults: 'default', now).
+    Identical frames are stored once, keyed by SHA-256.
+    """
+    denied = ingest_denied()
+    if denied:
+        return denied
+    if request.content_length and request.content_length > SNAPSHOT_MAX_BYTES:
+        return jsonify({'error': 'Snapshot too large'}), 413
+
+    camera_id = (request.args.get("camera_id") or "default")[:64]
+    try:
+        taken_at = datetime.datetime.fromisoformat(request.args["taken_at"]) if request.args.get("taken_at") else datetime.datetime.now()
+    except ValueError:
+        return jsonify({'error': 'Invalid taken_at'}), 400
+
+    tmp_dir = os.path.join(SHOTS_DIR, ".incoming")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        ext = None
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = request.stream.read(SNAPSHOT_CHUNK)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = next((e for sig, e in IMAGE_SIGNATURES if chunk.startswith(sig)), "")
+                    if not ext:
+                        return jsonify({'error': 'Unsupported image format'}), 415
+                size += len(chunk)
+                if size > SNAPSHOT_MAX_BYTES:
+                    return jsonify({'error': 'Snapshot too large'}), 413
+                digest.update(chunk)
+                out.write(chunk)
+        if not size:
+            return jsonify({'error': 'Empty body'}), 400
+
+        sha = digest.hexdigest()
+        rel_path = f"{taken_at:%Y/%m/%d}/{sha}{ext}"
+        # the body is on disk now; only the DB step counts against the write budget
+        with admission.slot("write"), get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT path FROM snapshots WHERE sha256=%s", (sha,))
+            existing = cur.fetchone()
+            if existing:
+                return jsonify({'sha256': sha, 'path': existing["path"], 'duplicate': True}), 200
+            final_path = os.path.join(SHOTS_DIR, rel_path)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+            cur.execute(
+                """
+                INSERT INTO snapshots (camera_id, taken_at, size_bytes, sha256, path)
+                VALUES (%s, %s, %s, %s, %s) ON CONFLICT (sha256) DO NOTHING RETURNING path
+                """,
+                (camera_id, taken_at, size, sha, rel_path)
+            )
+            if cur.fetchone() is None:
+                # a concurrent upload of the same frame got in first: keep its file and row
+                cur.execute("SELECT path FROM snapshots WHERE sha256=%s", (sha,))
+                existing = cur.fetchone()["path"]
+                if existing != rel_path:
+                    os.remove(final_path)
+                return jsonify({'sha256': sha, 'path': existing, 'duplicate': True}), 200
+        return jsonify({'sha256': sha, 'path': rel_path, 'duplicate': False}), 201
+    except Overloaded as e:
+        app.logger.warning("Shedding %s request to upload_snapshot", e.request_class)
+        return jsonify({'error': 'Server busy, please retry.'}), 503, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        app.logger.exception("Error in /snapshots")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 # -------------------------
 # Run App
 # -------------------------
@@ -0,0 +1,96 @@
+# bench_admission.py (Simulated 10x overload of the DB pool, with and without admission control)
+#
+#   python bench_admission.py [--seconds 3] [--overload 10]
+#
+# The pool is modelled as a semaphore of POOL_MAX connections with a fixed query time;
+# requests arrive open-loop at `overload` times the pool's throughput and are served
+# by a fixed set of worker threads (like gunicorn threads). Reports per-class latency
+# and how many requests were served, shed (503) or timed out.
+import time
+import random
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import AdmissionController, Overloaded, default_classes
+
+POOL_MAX = 6
+QUERY_SECONDS = 0.05
+WORKERS = 64
+POOL_TIMEOUT = 30.0  # psycopg_pool default
+MIX = (("polling", 0.92), ("interactive", 0.05), ("write", 0.02), ("auth", 0.01))
+
+
+def run(mode, seconds, overload):
+    pool = threading.BoundedSemaphore(POOL_MAX)
+    controller = AdmissionController(POOL_MAX, default_classes(POOL_MAX))
+    results = {name: {"latency": [], "served": 0, "shed": 0, "timeout": 0} for name, _ in MIX}
+    lock = threading.Lock()
+    rng = random.Random(42)
+
+    def handle(request_class, arrived):
+        outcome = "served"
+        try:
+            if mode == "admission":
+                controller.acquire(request_class)
+            try:
+                if pool.acquire(timeout=POOL_TIMEOUT):
+                    time.sleep(QUERY_SECONDS)
+                    pool.release()
+                else:
+                    outcome = "timeout"
+            finally:
+                if mode == "admission":
+                    controller.release(request_class)
+        except Overloaded:
+            outcome = "shed"
+        with lock:
+            r = results[request_class]
+            r[outcome] += 1
+            if outcome == "served":
+                r["latency"].append(time.monotonic() - arrived)
+
+    rate = overload * POOL_MAX / QUERY_SECONDS
+    names = [n for n, _ in MIX]
+    weights = [w for _, w in MIX]
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        start = time.monotonic()
+        sent = 0
+        while time.monotonic() - start < seconds:
+            # open-loop arrivals at `rate` per second
+            due = int((time.monotonic() - start) * rate)
+            while sent < due:
+                executor.submit(handle, rng.choices(names, weights)[0], time.monotonic())
+                sent += 1
+            time.sleep(0.001)
+    return results, sent
+
+
+def pct(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--overload", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"pool={POOL_MAX} query={QUERY_SECONDS * 1000:.0f}ms workers={WORKERS} "
+          f"offered={args.overload:g}x capacity for {args.seconds:g}s")
+    for mode in ("unbounded", "admission"):
+        results, sent = run(mode, args.seconds, args.overload)
+        print(f"\n== {mode} ({sent} requests) ==")
+        print(f"{'class':<12}{'served':>8}{'shed':>8}{'timeout':>9}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, r in results.items():
+            lat = r["latency"]
+            print(f"{name:<12}{r['served']:>8}{r['shed']:>8}{r['timeout']:>9}"
+                  f"{(statistics.median(lat) * 1000 if lat else float('nan')):>10.0f}{pct(lat, 0.99):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench_columnar.py (Row-of-objects vs columnar chart payloads for a 10k-point series)
+#
+#   python bench_columnar.py [--points 10000] [--repeat 20]
+#
+# Both paths start from what the driver hands back for a sensordata query and end
+# with the JSON bytes sent to the browser:
+#   rows:     dict_row per row -> format_datetime_in_results (strftime per row) -> json
+#   columnar: tuple_row with epoch ints and rounded floats -> columnar_from_rows -> json
+import json
+import time
+import random
+import struct
+import argparse
+import datetime
+
+from wire import columnar_from_rows
+
+COLUMNS = ["datetime", "humidity", "temperature", "ammonia", "light1", "light2", "exhaustfan"]
+
+
+def float4(x):
+    """What a REAL column looks like once psycopg hands it back as a Python float."""
+    return struct.unpack("f", struct.pack("f", x))[0]
+
+
+def make_rows(points):
+    rng = random.Random(1)
+    start = datetime.datetime(2025, 8, 1)
+    rows = []
+    for i in range(points):
+        rows.append((
+            start + datetime.timedelta(seconds=i),
+            float4(rng.uniform(50, 80)), float4(rng.uniform(25, 35)), float4(rng.uniform(0, 20)),
+            "ON", "OFF", "ON",
+        ))
+    return rows
+
+
+def legacy_payload(rows):
+    # dict_row builds one dict per row
+    results = [dict(zip(COLUMNS, r)) for r in rows]
+    # same work as app.format_datetime_in_results
+    for result in results:
+        result["datetime"] = result["datetime"].strftime("%Y-%m-%d %I:%M:%S %p")
+    return json.dumps(results, separators=(",", ":")).encode()
+
+
+def columnar_payload(rows):
+    # what fetch_columnar's SELECT returns: epoch seconds and 2-decimal floats
+    names = ["t", "humidity", "temperature", "ammonia", "light1", "light2", "exhaustfan"]
+    out = columnar_from_rows(names, rows)
+    out["cursor"] = len(rows)
+    return json.dumps(out, separators=(",", ":")).encode()
+
+
+def columnar_rows(rows):
+    epoch = datetime.datetime(1970, 1, 1)
+    return [
+        (int((r[0] - epoch).total_seconds()), round(r[1], 2), round(r[2], 2), round(r[3], 2), r[4], r[5], r[6])
+        for r in rows
+    ]
+
+
+def timed(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.points)
+    db_columnar = columnar_rows(rows)  # the conversion happens in SQL, so it is not timed
+
+    legacy_s, legacy_body = timed(legacy_payload, rows, args.repeat)
+    columnar_s, columnar_body = timed(columnar_payload, db_columnar, args.repeat)
+
+    print(f"{args.points} points, best of {args.repeat}")
+    print(f"{'format':<10}{'CPU ms':>10}{'bytes':>12}")
+    print(f"{'rows':<10}{legacy_s * 1000:>10.2f}{len(legacy_body):>12}")
+    print(f"{'columnar':<10}{columnar_s * 1000:>10.2f}{len(columnar_body):>12}")
+    print(f"speedup {legacy_s / columnar_s:.1f}x, payload {len(legacy_body) / len(columnar_body):.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
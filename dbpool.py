@@ -0,0 +1,112 @@
+# dbpool.py (Background upkeep and telemetry for the psycopg_pool ConnectionPool)
+import time
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class PoolManager(threading.Thread):
+    """
+    Keeps the connection pool sized to its load and its idle connections healthy.
+
+    Every `interval` seconds it reads (and resets) the pool counters:
+      - if requests waited longer than `grow_wait_ms` on average, or are waiting
+        right now, min_size grows by one so more connections stay warm;
+      - if utilization (busy connection-time / available connection-time) stays
+        under `shrink_utilization` for `shrink_after` intervals, min_size shrinks
+        by one, down to `min_floor`. Idle connections above min_size are closed
+        by the pool after max_idle.
+    Every `check_interval` seconds idle connections are health-checked with
+    pool.check(), which replaces broken ones before a request can get them.
+    """
+
+    def __init__(self, pool, min_floor, max_size, interval=10.0, check_interval=30.0,
+                 grow_wait_ms=50.0, shrink_utilization=0.3, shrink_after=6):
+        super().__init__(name="pool-manager", daemon=True)
+        self.pool = pool
+        self.min_floor = min_floor
+        self.max_size = max_size
+        self.interval = interval
+        self.check_interval = check_interval
+        self.grow_wait_ms = grow_wait_ms
+        self.shrink_utilization = shrink_utilization
+        self.shrink_after = shrink_after
+        self._quiet_ticks = 0
+        self._last_tick = time.monotonic()
+        self._last_check = time.monotonic()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.telemetry = {}
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                log.exception("pool manager: tick failed")
+
+    def tick(self):
+        now = time.monotonic()
+        elapsed_ms = max((now - self._last_tick) * 1000, 1.0)
+        self._last_tick = now
+        stats = self.pool.pop_stats()
+
+        requests = stats.get("requests_num", 0)
+        avg_wait_ms = stats.get("requests_wait_ms", 0) / requests if requests else 0.0
+        waiting = stats.get("requests_waiting", 0)
+        size = stats.get("pool_size", 0)
+        utilization = stats.get("usage_ms", 0) / (elapsed_ms * size) if size else 0.0
+
+        min_size = self.pool.min_size
+        target = min_size
+        if (avg_wait_ms > self.grow_wait_ms or waiting) and min_size < self.max_size:
+            target = min_size + 1
+            self._quiet_ticks = 0
+        elif utilization < self.shrink_utilization and min_size > self.min_floor:
+            self._quiet_ticks += 1
+            if self._quiet_ticks >= self.shrink_after:
+                target = min_size - 1
+                self._quiet_ticks = 0
+        else:
+            self._quiet_ticks = 0
+        if target != min_size:
+            self.pool.resize(min_size=target, max_size=self.max_size)
+            log.info("pool manager: min_size %s -> %s (avg wait %.1fms, utilization %.0f%%)",
+                     min_size, target, avg_wait_ms, utilization * 100)
+
+        checked = False
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self.pool.check()
+            checked = True
+
+        with self._lock:
+            self.telemetry = {
+                "min_size": target,
+                "max_size": self.max_size,
+                "pool_size": size,
+                "pool_available": stats.get("pool_available", 0),
+                "requests": requests,
+                "requests_waiting": waiting,
+                "avg_wait_ms": round(avg_wait_ms, 2),
+                "utilization": round(utilization, 3),
+                "requests_errors": stats.get("requests_errors", 0),
+                "connections_errors": stats.get("connections_errors", 0),
+                "connections_lost": stats.get("connections_lost", 0),
+                "returns_bad": stats.get("returns_bad", 0),
+                "health_checked": checked,
+                "interval_s": round(elapsed_ms / 1000, 1),
+            }
+
+    def snapshot(self):
+        """Telemetry from the last interval plus the pool's current gauges."""
+        current = self.pool.get_stats()
+        with self._lock:
+            return {
+                "last_interval": dict(self.telemetry),
+                "now": {k: current.get(k, 0) for k in ("pool_min", "pool_max", "pool_size", "pool_available", "requests_waiting")},
+            }
@@ -0,0 +1,288 @@
+# reports.py (Background report jobs with artifacts cached by spec hash)
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg.types.json import Jsonb
+
+log = logging.getLogger(__name__)
+
+# -------------------------
+# Report sections (one aggregate query each, bucketed per day)
+# -------------------------
+REPORT_QUERIES = {
+    "environment": """
+        SELECT date_trunc('day', datetime) AS day, COUNT(*) AS readings,
+               AVG(temperature) AS avg_temperature, MIN(temperature) AS min_temperature, MAX(temperature) AS max_temperature,
+               AVG(humidity) AS avg_humidity, MIN(humidity) AS min_humidity, MAX(humidity) AS max_humidity,
+               AVG(ammonia) AS avg_ammonia, MAX(ammonia) AS max_ammonia
+        FROM sensordata WHERE datetime >= %s AND datetime < %s
+        GROUP BY 1 ORDER BY 1
+    """,
+    "growth": """
+        SELECT date_trunc('day', datetime) AS day, COUNT(*) AS weighings,
+               COUNT(DISTINCT chicknumber) AS chicks,
+               AVG(weight) AS avg_weight, MIN(weight) AS min_weight, MAX(weight) AS max_weight
+        FROM sensordata3 WHERE datetime >= %s AND datetime < %s
+        GROUP BY 1 ORDER BY 1
+    """,
+    "health": """
+        SELECT date_trunc('day', datetime) AS day, status, COUNT(*) AS checks,
+               COUNT(DISTINCT chicknumber) AS chicks
+        FROM chickstatus WHERE datetime >= %s AND datetime < %s
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """,
+    "feeding": """
+        SELECT date_trunc('day', feed_time) AS day, feed_type, COUNT(*) AS feedings,
+               SUM(amount) AS total_amount
+        FROM feeding_schedule WHERE feed_time >= %s AND feed_time < %s
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """,
+}
+
+PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+
+
+def normalize_spec(raw, today=None):
+    """
+    Turn a submitted spec into its canonical form.
+
+    raw: {"period": "daily"|"weekly"|"monthly"} or {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"},
+         plus optional "metrics" (subset of REPORT_QUERIES) and "farm".
+    Relative periods resolve to absolute dates ending today (inclusive), so the
+    spec hash identifies the exact data range. Raises ValueError if invalid.
+    """
+    today = today or datetime.date.today()
+    if raw.get("period"):
+        days = PERIOD_DAYS.get(raw["period"])
+        if not days:
+            raise ValueError(f"Unknown period: {raw['period']}")
+        end = today
+        start = today - datetime.timedelta(days=days - 1)
+    else:
+        try:
+            start = datetime.date.fromisoformat(str(raw["start"]))
+            end = datetime.date.fromisoformat(str(raw["end"]))
+        except (KeyError, ValueError):
+            raise ValueError("start and end must be YYYY-MM-DD dates")
+    if end < start:
+        raise ValueError("end must not be before start")
+
+    metrics = raw.get("metrics") or list(REPORT_QUERIES)
+    if isinstance(metrics, str):
+        metrics = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in metrics if m not in REPORT_QUERIES]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "metrics": sorted(set(metrics)),
+        "farm": str(raw.get("farm") or "default"),
+    }
+
+
+def spec_hash(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return float(value)  # Decimal from AVG/SUM
+
+
+def compute_report(cur, spec):
+    """Run the aggregate query for each requested section over [start, end]."""
+    start = datetime.datetime.fromisoformat(spec["start"])
+    end = datetime.datetime.fromisoformat(spec["end"]) + datetime.timedelta(days=1)
+    sections = {}
+    for metric in spec["metrics"]:
+        cur.execute(REPORT_QUERIES[metric], (start, end))
+        sections[metric] = [{k: _jsonable(v) for k, v in row.items()} for row in cur.fetchall()]
+    return {"spec": spec, "generated_at": datetime.datetime.now().isoformat(timespec="seconds"), "sections": sections}
+
+
+def invalidate_artifacts(cur, first_day, last_day):
+    """Drop cached artifacts whose [start, end] overlaps first_day..last_day; returns how many."""
+    cur.execute(
+        "DELETE FROM report_artifacts WHERE (spec->>'start')::date <= %s AND (spec->>'end')::date >= %s",
+        (last_day, first_day)
+    )
+    return cur.rowcount
+
+
+class ReportJobs:
+    """
+    Runs report jobs in a background thread pool. Job state lives in report_jobs
+    and results in report_artifacts (keyed by spec hash), so any app worker can
+    answer status polls and identical specs are served from the artifact.
+
+    An artifact whose range includes today is still growing; it is reused only
+    for `partial_ttl` seconds before being recomputed.
+
+    Each job records the worker that owns it, and that worker refreshes
+    heartbeat_at every `heartbeat_interval` seconds while the job is queued or
+    running. A queued/running job whose heartbeat is older than `stale_after`
+    belonged to a worker that died (e.g. a restart); it is marked failed instead
+    of being joined or polled forever. Heartbeats go through `heartbeat_conn`
+    (default: get_conn) so they can bypass limits the jobs themselves wait on.
+    """
+
+    def __init__(self, get_conn, workers=2, partial_ttl=300, heartbeat_interval=15, stale_after=60,
+                 heartbeat_conn=None):
+        self.get_conn = get_conn
+        self.heartbeat_conn = heartbeat_conn or get_conn
+        self.partial_ttl = partial_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._active = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._heartbeat, name="report-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            try:
+                with self.heartbeat_conn() as conn, conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE report_jobs SET heartbeat_at=NOW() WHERE id = ANY(%s) AND worker_id=%s",
+                        (active, self.worker_id)
+                    )
+            except Exception:
+                log.warning("report jobs: heartbeat failed", exc_info=True)
+
+    def expire_stale(self, cur=None, job_id=None):
+        """Mark queued/running jobs with an expired heartbeat failed; returns how many."""
+        if cur is None:
+            with self.get_conn() as conn, conn.cursor() as cur:
+                return self.expire_stale(cur, job_id)
+        cur.execute(
+            """
+            UPDATE report_jobs SET status='failed', error='Report worker stopped before finishing', finished_at=NOW()
+            WHERE status IN ('queued','running')
+              AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - make_interval(secs => %s))
+              AND (%s::int IS NULL OR id=%s)
+            """,
+            (self.stale_after, job_id, job_id)
+        )
+        return cur.rowcount
+
+    def _fresh_artifact(self, cur, digest, spec):
+        cur.execute("SELECT created_at FROM report_artifacts WHERE spec_hash=%s", (digest,))
+        row = cur.fetchone()
+        if not row:
+            return False
+        if spec["end"] < datetime.date.today().isoformat():
+            return True
+        age = (datetime.datetime.now() - row["created_at"]).total_seconds()
+        return age < self.partial_ttl
+
+    def submit(self, spec, user_id=None):
+        """Create a job for a normalized spec; returns the job row (status 'done' on a cache hit)."""
+        digest = spec_hash(spec)
+        with self.get_conn() as conn, conn.cursor() as cur:
+            cached = self._fresh_artifact(cur, digest, spec)
+            # reuse a job a live worker is already computing for the same spec
+            if not cached:
+                cur.execute(
+                    """
+                    SELECT * FROM report_jobs
+                    WHERE spec_hash=%s AND status IN ('queued','running')
+                      AND heartbeat_at >= NOW() - make_interval(secs => %s)
+                    ORDER BY id DESC LIMIT 1
+                    """,
+                    (digest, self.stale_after)
+                )
+                running = cur.fetchone()
+                if running:
+                    return running
+            cur.execute(
+                """
+                INSERT INTO report_jobs (spec_hash, spec, status, submitted_by, finished_at, worker_id, heartbeat_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW()) RETURNING *
+                """,
+                (digest, Jsonb(spec), "done" if cached else "queued", user_id,
+                 datetime.datetime.now() if cached else None, self.worker_id)
+            )
+            job = cur.fetchone()
+        if not cached:
+            with self._lock:
+                self._active.add(job["id"])
+            self.executor.submit(self._run, job["id"], digest, spec)
+        return job
+
+    def _run(self, job_id, digest, spec):
+        try:
+            self._compute(job_id, digest, spec)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _compute(self, job_id, digest, spec):
+        try:
+            with self.get_conn() as conn, conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE report_jobs SET status='running', started_at=NOW(), heartbeat_at=NOW() "
+                    "WHERE id=%s AND status='queued'",
+                    (job_id,)
+                )
+                if not cur.rowcount:
+                    return  # expired while queued
+            with self.get_conn() as conn, conn.cursor() as cur:
+                result = compute_report(cur, spec)
+                cur.execute(
+                    """
+                    INSERT INTO report_artifacts (spec_hash, spec, result, created_at)
+                    VALUES (%s, %s, %s, NOW())
+                    ON CONFLICT (spec_hash) DO UPDATE SET result=EXCLUDED.result, created_at=NOW()
+                    """,
+                    (digest, Jsonb(spec), Jsonb(result))
+                )
+                cur.execute(
+                    "UPDATE report_jobs SET status='done', finished_at=NOW() WHERE id=%s AND status='running'",
+                    (job_id,)
+                )
+                if not cur.rowcount:
+                    log.warning("report job %s expired before it finished; artifact kept", job_id)
+        except Exception as e:
+            log.exception("report job %s failed", job_id)
+            try:
+                with self.get_conn() as conn, conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE report_jobs SET status='failed', error=%s, finished_at=NOW() WHERE id=%s",
+                        (str(e), job_id)
+                    )
+            except Exception:
+                log.exception("report job %s: could not record failure", job_id)
+
+    def get_job(self, job_id):
+        with self.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT * FROM report_jobs WHERE id=%s", (job_id,))
+            job = cur.fetchone()
+            if job and job["status"] in ("queued", "running") and self.expire_stale(cur, job_id):
+                cur.execute("SELECT * FROM report_jobs WHERE id=%s", (job_id,))
+                job = cur.fetchone()
+            return job
+
+    def get_artifact(self, digest):
+        with self.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT result FROM report_artifacts WHERE spec_hash=%s", (digest,))
+            row = cur.fetchone()
+            return row["result"] if row else None
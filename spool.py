@@ -0,0 +1,407 @@
+# spool.py (Local write-ahead spool for sensor readings while Postgres is unreachable)
+import os
+import mmap
+import json
+import zlib
+import uuid
+import fcntl
+import struct
+import logging
+import threading
+
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+log = logging.getLogger(__name__)
+
+# -------------------------
+# On-disk format
+# -------------------------
+# Each segment file is preallocated to SEGMENT_SIZE bytes and memory-mapped.
+#   segment header: magic (8 bytes) + first sequence number (u64)
+#   record:         payload length (u32) + crc32 (u32) + sequence (u64) + payload
+# A zero length marks the end of written data. The header is written after the
+# payload, so a torn append is never visible as a record.
+SEGMENT_MAGIC = b"CCSPOOL1"
+SEGMENT_HEADER = struct.Struct("<8sQ")
+RECORD_HEADER = struct.Struct("<IIQ")
+SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENT_SUFFIX = ".seg"
+
+
+def _record_crc(seq, payload):
+    return zlib.crc32(payload, zlib.crc32(struct.pack("<Q", seq)))
+
+
+def _segment_name(first_seq):
+    return f"{first_seq:020d}{SEGMENT_SUFFIX}"
+
+
+def _scan(buf, start):
+    """Yield (seq, payload, next_offset) for every valid record from `start`."""
+    size = len(buf)
+    offset = start
+    while offset + RECORD_HEADER.size <= size:
+        length, crc, seq = RECORD_HEADER.unpack_from(buf, offset)
+        end = offset + RECORD_HEADER.size + length
+        if length == 0 or end > size:
+            return
+        payload = bytes(buf[offset + RECORD_HEADER.size:end])
+        if _record_crc(seq, payload) != crc:
+            log.warning("spool: checksum mismatch at offset %s; ignoring tail of segment", offset)
+            return
+        yield seq, payload, end
+        offset = end
+
+
+class Spool:
+    """
+    Append-only spool of (table, row) readings, stored in memory-mapped segments.
+
+    Usage:
+        spool = Spool.acquire("spool")
+        spool.append("sensordata", {"temperature": 31.2, ...})
+        for seq, table, row in spool.read_batch(after_seq, 5000): ...
+        spool.mark_replayed(seq)
+    """
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # One process per spool directory; the lock is held for the process lifetime.
+        self._lock_file = open(os.path.join(directory, "spool.lock"), "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise
+
+        self.spool_id = self._load_spool_id()
+        self._replayed = self._load_checkpoint()
+        self._read_cursor = None  # (segment first_seq, offset, last seq read)
+        self._recover()
+
+    @classmethod
+    def acquire(cls, base_dir, slots=8, segment_size=SEGMENT_SIZE):
+        """Open the first unlocked slot under base_dir (one per worker process)."""
+        for slot in range(slots):
+            try:
+                return cls(os.path.join(base_dir, str(slot)), segment_size=segment_size)
+            except OSError:
+                continue
+        raise RuntimeError(f"No free spool slot under {base_dir}")
+
+    # ---- state files ----
+    def _load_spool_id(self):
+        path = os.path.join(self.directory, "spool.id")
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            spool_id = uuid.uuid4().hex
+            self._write_atomic(path, spool_id)
+            return spool_id
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, "checkpoint")) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_atomic(self, path, text):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ---- segments ----
+    def _segments(self):
+        """Return sorted first_seq values of the segments on disk."""
+        firsts = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                try:
+                    firsts.append(int(name[:-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(firsts)
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.directory, _segment_name(first_seq))
+
+    def _open_segment(self, first_seq, create=False):
+        path = self._segment_path(first_seq)
+        fd = os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o644)
+        try:
+            if create:
+                os.ftruncate(fd, self.segment_size)
+            buf = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        if create:
+            SEGMENT_HEADER.pack_into(buf, 0, SEGMENT_MAGIC, first_seq)
+        return buf
+
+    def _recover(self):
+        """Find the append position by scanning the newest segment."""
+        firsts = self._segments()
+        if not firsts:
+            self._next_seq = self._replayed + 1
+            self._active_first = self._next_seq
+            self._active = self._open_segment(self._active_first, create=True)
+            self._offset = SEGMENT_HEADER.size
+            return
+
+        self._active_first = firsts[-1]
+        self._active = self._open_segment(self._active_first)
+        magic, _ = SEGMENT_HEADER.unpack_from(self._active, 0)
+        if magic != SEGMENT_MAGIC:
+            raise RuntimeError(f"Corrupt spool segment: {self._segment_path(self._active_first)}")
+        self._offset = SEGMENT_HEADER.size
+        self._next_seq = self._active_first
+        for seq, _, end in _scan(self._active, SEGMENT_HEADER.size):
+            self._offset = end
+            self._next_seq = seq + 1
+        # Zero anything after the last valid record so a torn tail can't resurface.
+        if self._offset + RECORD_HEADER.size <= len(self._active):
+            self._active[self._offset:self._offset + RECORD_HEADER.size] = b"\x00" * RECORD_HEADER.size
+        self._next_seq = max(self._next_seq, self._replayed + 1)
+
+    def _roll(self):
+        self._active.flush()
+        self._active.close()
+        self._active_first = self._next_seq
+        self._active = self._open_segment(self._active_first, create=True)
+        self._offset = SEGMENT_HEADER.size
+
+    # ---- public API ----
+    def append(self, table, row):
+        """Append one reading and return its sequence number."""
+        payload = json.dumps([table, row], separators=(",", ":"), default=str).encode()
+        needed = RECORD_HEADER.size + len(payload)
+        if needed > self.segment_size - SEGMENT_HEADER.size - RECORD_HEADER.size:
+            raise ValueError("Reading too large for spool segment")
+        with self._lock:
+            # keep room for the zero terminator after the record
+            if self._offset + needed + RECORD_HEADER.size > self.segment_size:
+                self._roll()
+            seq = self._next_seq
+            start = self._offset + RECORD_HEADER.size
+            self._active[start:start + len(payload)] = payload
+            RECORD_HEADER.pack_into(self._active, self._offset, len(payload), _record_crc(seq, payload), seq)
+            self._offset += needed
+            self._next_seq = seq + 1
+            return seq
+
+    def pending(self):
+        """True if there are readings that have not been replayed yet."""
+        return self._next_seq - 1 > self._replayed
+
+    def last_replayed(self):
+        return self._replayed
+
+    def flush(self):
+        with self._lock:
+            self._active.flush()
+
+    def read_batch(self, after_seq, limit):
+        """Return up to `limit` (seq, table, row) tuples with seq > after_seq, in order."""
+        out = []
+        with self._lock:
+            firsts = self._segments()
+            cursor = self._read_cursor
+            for i, first in enumerate(firsts):
+                following = firsts[i + 1] if i + 1 < len(firsts) else None
+                if following is not None and following <= after_seq + 1:
+                    continue
+                if first == self._active_first:
+                    buf, owned = self._active, False
+                else:
+                    buf, owned = self._open_segment(first), True
+                try:
+                    start = SEGMENT_HEADER.size
+                    if cursor and cursor[0] == first and cursor[2] == after_seq:
+                        start = cursor[1]
+                    for seq, payload, end in _scan(buf, start):
+                        if seq <= after_seq:
+                            continue
+                        table, row = json.loads(payload)
+                        out.append((seq, table, row))
+                        self._read_cursor = (first, end, seq)
+                        if len(out) >= limit:
+                            return out
+                finally:
+                    if owned:
+                        buf.close()
+        return out
+
+    def mark_replayed(self, seq):
+        """Record that everything up to `seq` is in Postgres and drop consumed segments."""
+        with self._lock:
+            if seq <= self._replayed:
+                return
+            self._replayed = seq
+            self._write_atomic(os.path.join(self.directory, "checkpoint"), str(seq))
+            firsts = self._segments()
+            for i, first in enumerate(firsts):
+                following = firsts[i + 1] if i + 1 < len(firsts) else None
+                if first == self._active_first or following is None or following - 1 > seq:
+                    continue
+                try:
+                    os.remove(self._segment_path(first))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._active.flush()
+            self._active.close()
+            self._lock_file.close()
+
+
+class SpoolReplayer(threading.Thread):
+    """
+    Background thread that drains a Spool into Postgres with COPY.
+
+    Each batch is copied and the spool_checkpoint row for this spool is advanced
+    in the same transaction, so a crash mid-replay never inserts a reading twice.
+    If Postgres rejects the COPY for anything but a connectivity problem, the batch
+    is retried row by row and rejected readings are moved to spool_quarantine, so
+    one bad reading can't block the spool. `on_replayed(cur, batch)`, if given,
+    runs in that same transaction once a batch is stored.
+    """
+
+    def __init__(self, spool, get_conn, columns, batch_size=5000, interval=5.0, on_replayed=None):
+        super().__init__(name="spool-replayer", daemon=True)
+        self.spool = spool
+        self.get_conn = get_conn
+        self.columns = columns
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_replayed = on_replayed
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self.spool.pending():
+                continue
+            try:
+                replayed = self.drain()
+                if replayed:
+                    log.info("spool: replayed %s readings into Postgres", replayed)
+            except Exception:
+                log.warning("spool: replay failed; will retry", exc_info=True)
+            self.spool.flush()
+
+    def drain(self):
+        """Copy every pending reading into Postgres; returns the number replayed."""
+        total = 0
+        while self.spool.pending() and not self._stopping.is_set():
+            with self.get_conn() as conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT last_seq FROM spool_checkpoint WHERE spool_id=%s FOR UPDATE",
+                    (self.spool.spool_id,)
+                )
+                row = cur.fetchone()
+                db_seq = row["last_seq"] if row else 0
+                after = max(db_seq, self.spool.last_replayed())
+                batch = self.spool.read_batch(after, self.batch_size)
+                if not batch:
+                    self.spool.mark_replayed(after)
+                    return total
+                try:
+                    with conn.transaction():
+                        self._copy(cur, batch)
+                except psycopg.OperationalError:
+                    raise
+                except psycopg.Error:
+                    log.warning("spool: COPY rejected, retrying batch row by row", exc_info=True)
+                    self._insert_rows(conn, cur, batch)
+                if self.on_replayed:
+                    self.on_replayed(cur, batch)
+                last = batch[-1][0]
+                cur.execute(
+                    """
+                    INSERT INTO spool_checkpoint (spool_id, last_seq, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (spool_id) DO UPDATE SET last_seq=EXCLUDED.last_seq, updated_at=NOW()
+                    """,
+                    (self.spool.spool_id, last)
+                )
+            # committed: safe to advance the local checkpoint
+            self.spool.mark_replayed(last)
+            total += len(batch)
+        return total
+
+    def _insert_rows(self, conn, cur, batch):
+        """Insert readings one at a time, quarantining each one Postgres rejects."""
+        for seq, table, row in batch:
+            allowed = self.columns.get(table)
+            if not allowed:
+                continue
+            cols = [c for c in allowed if c in row]
+            try:
+                with conn.transaction():
+                    cur.execute(
+                        sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+                            sql.Identifier(table),
+                            sql.SQL(", ").join(sql.Identifier(c) for c in cols),
+                            sql.SQL(", ").join(sql.Placeholder() * len(cols))
+                        ),
+                        [row[c] for c in cols]
+                    )
+            except psycopg.OperationalError:
+                raise
+            except psycopg.Error as e:
+                log.warning("spool: quarantining reading %s for %s: %s", seq, table, e)
+                cur.execute(
+                    """
+                    INSERT INTO spool_quarantine (spool_id, seq, table_name, reading, error)
+                    VALUES (%s, %s, %s, %s, %s)
+                    """,
+                    (self.spool.spool_id, seq, table, Jsonb(row), str(e))
+                )
+
+    def _copy(self, cur, batch):
+        """COPY consecutive runs of same-table readings, preserving spool order."""
+        run_table, run_cols, run_rows = None, None, []
+
+        def flush_run():
+            if not run_rows:
+                return
+            stmt = sql.SQL("COPY {} ({}) FROM STDIN").format(
+                sql.Identifier(run_table),
+                sql.SQL(", ").join(sql.Identifier(c) for c in run_cols)
+            )
+            with cur.copy(stmt) as copy:
+                for values in run_rows:
+                    copy.write_row(values)
+
+        for _, table, row in batch:
+            allowed = self.columns.get(table)
+            if not allowed:
+                log.warning("spool: dropping reading for unknown table %r", table)
+                continue
+            cols = tuple(c for c in allowed if c in row)
+            if table != run_table or cols != run_cols:
+                flush_run()
+                run_table, run_cols, run_rows = table, cols, []
+            run_rows.append([row[c] for c in cols])
+        flush_run()
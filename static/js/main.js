@@ -157,8 +157,18 @@ document.addEventListener('DOMContentLoaded', function() {
     console.warn('Humidity chart canvas not found! (ID: lineChart1)');
   }
 
+  // Delta sync: the server only sends sensordata rows with id > envCursor,
+  // so each poll appends the new points instead of redrawing the window.
+  // format=columnar returns {t: [epoch...], temperature: [...], ...} instead of row objects.
+  var envCursor = 0;
+
+  // "t" is the naive DB timestamp as epoch seconds, so format it in UTC to show the stored wall-clock time
+  function epochLabel(t) {
+    return new Date(t * 1000).toLocaleTimeString([], { timeZone: 'UTC' });
+  }
+
   function fetchData() {
-    fetch('/data') // Updated to fetch data from Flask server
+    fetch('/data?format=columnar&since=' + envCursor)
       .then(response => {
         if (!response.ok) {
           throw new Error('Network response was not ok ' + response.statusText);
@@ -166,41 +176,43 @@ document.addEventListener('DOMContentLoaded', function() {
         return response.json();
       })
       .then(data => {
-        if (
-          data.Temp !== undefined &&
-          data.Hum !== undefined &&
-          data.Amm !== undefined &&
-          data.Light1 !== undefined &&
-          data.Light2 !== undefined &&
-          data.ExhaustFan !== undefined
-        ) {
-          // Get current time as label for charts
-          const label = new Date().toLocaleTimeString();
-
-          // Update temperature and humidity charts (functions should be defined elsewhere)
-          if (lineChartTemperature) addDataTemperature(label, data.Temp);
-          if (lineChartHumidity) addDataHumidity(label, data.Hum);
-
-
-          // Update temperature and humidity display - these IDs are assumed to be in the HTML
-          const tempElement = document.getElementById("temp");
-          const humElement = document.getElementById("hum");
-          const ammElement = document.getElementById("amm");
-          const light1Element = document.getElementById("light1-status");
-          const light2Element = document.getElementById("light2-status");
-          const exhaustFanElement = document.getElementById("exhaustfan-status");
-
-          if (tempElement) tempElement.innerText = `${data.Temp.toFixed(1)}°C`;
-          if (humElement) humElement.innerText = `${data.Hum.toFixed(1)} %`;
-          if (ammElement) ammElement.innerText = `${data.Amm.toFixed(1)} ppm`;
-
-          if (light1Element) light1Element.innerText = data.Light1 === "ON" ? "ON" : "OFF";
-          if (light2Element) light2Element.innerText = data.Light2 === "ON" ? "ON" : "OFF";
-          if (exhaustFanElement) exhaustFanElement.innerText =
-            data.ExhaustFan === "ON" ? "ON" : "OFF";
-        } else {
-          console.log("Some data is missing from /data endpoint:", data);
+        if (!Array.isArray(data.t)) {
+          console.log("Unexpected response from /data endpoint:", data);
+          return;
         }
+        envCursor = data.cursor;
+        const count = data.t.length;
+        if (count === 0) return;
+
+        // Append all new points, then redraw each chart once
+        const labels = data.t.map(epochLabel);
+        dataTemperature.labels.push(...labels);
+        dataTemperature.datasets[0].data.push(...data.temperature);
+        dataHumidity.labels.push(...labels);
+        dataHumidity.datasets[0].data.push(...data.humidity);
+        updateChart(lineChartTemperature, dataTemperature);
+        updateChart(lineChartHumidity, dataHumidity);
+
+        // Update the live readouts from the newest point - these IDs are assumed to be in the HTML
+        const last = count - 1;
+        const temperature = data.temperature[last];
+        const humidity = data.humidity[last];
+        const ammonia = data.ammonia[last];
+        const tempElement = document.getElementById("temp");
+        const humElement = document.getElementById("hum");
+        const ammElement = document.getElementById("amm");
+        const light1Element = document.getElementById("light1-status");
+        const light2Element = document.getElementById("light2-status");
+        const exhaustFanElement = document.getElementById("exhaustfan-status");
+
+        if (tempElement && temperature != null) tempElement.innerText = `${temperature.toFixed(1)}°C`;
+        if (humElement && humidity != null) humElement.innerText = `${humidity.toFixed(1)} %`;
+        if (ammElement && ammonia != null) ammElement.innerText = `${ammonia.toFixed(1)} ppm`;
+
+        if (light1Element) light1Element.innerText = data.light1[last] === "ON" ? "ON" : "OFF";
+        if (light2Element) light2Element.innerText = data.light2[last] === "ON" ? "ON" : "OFF";
+        if (exhaustFanElement) exhaustFanElement.innerText =
+          data.exhaustfan[last] === "ON" ? "ON" : "OFF";
       })
       .catch(error => {
         console.error('Error fetching data from /data:', error);
@@ -790,25 +802,30 @@ document.addEventListener('DOMContentLoaded', function () {
 // ========================= Weight and Supplies ====================
 
 document.addEventListener('DOMContentLoaded', function () {
-  // Function to fetch data and update Weight
+  // Function to fetch data and update Weight (delta sync on the sensordata3 id)
+  var growthCursor = 0;
+
   function fetchData3() {
-    fetch('/get_growth_data')
+    fetch('/get_growth_data?since=' + growthCursor)
       .then(response => response.json())
       .then(data => {
-        // Check if data is an array and not empty
-        if (Array.isArray(data) && data.length > 0) {
-          // Get the latest data (first item in the array)
-          const latestData = data[0];
-
-          // Update the Weight (Assumed ID 'weight' for dashboard display)
-          const weightElement = document.getElementById("weight");
-          if (weightElement && latestData.Weight !== undefined) {
-            weightElement.innerText = `${latestData.Weight.toFixed(1)} g`;
-          } else if (weightElement) {
-            console.log("Weight data is missing in the latest record:", latestData);
-          }
-        } else {
-          console.log("No data received or data is empty for /get_growth_data.");
+        if (!Array.isArray(data.rows)) {
+          console.log("Unexpected response from /get_growth_data:", data);
+          return;
+        }
+        growthCursor = data.cursor;
+        // Nothing new since the last poll
+        if (data.rows.length === 0) return;
+
+        // Rows are oldest first; the newest weighing is the last one
+        const latestData = data.rows[data.rows.length - 1];
+
+        // Update the Weight (Assumed ID 'weight' for dashboard display)
+        const weightElement = document.getElementById("weight");
+        if (weightElement && latestData.weight != null) {
+          weightElement.innerText = `${latestData.weight.toFixed(1)} g`;
+        } else if (weightElement) {
+          console.log("Weight data is missing in the latest record:", latestData);
         }
       })
       .catch(error => {
@@ -0,0 +1,61 @@
+# wire.py (Compact columnar JSON for chart series)
+from psycopg import sql
+from psycopg.rows import tuple_row
+
+# table -> {output column: SQL expression}. "t" is the reading time as epoch seconds
+# (the naive DB timestamp read as UTC); REAL columns are rounded in SQL so float4
+# noise like 31.200000762939453 never reaches the payload.
+CHART_COLUMNS = {
+    "sensordata": {
+        "t": "EXTRACT(EPOCH FROM datetime)::bigint",
+        "temperature": "round(temperature::numeric, 2)::float8",
+        "humidity": "round(humidity::numeric, 2)::float8",
+        "ammonia": "round(ammonia::numeric, 2)::float8",
+        "light1": "light1",
+        "light2": "light2",
+        "exhaustfan": "exhaustfan",
+    },
+    "sensordata3": {
+        "t": "EXTRACT(EPOCH FROM datetime)::bigint",
+        "chicknumber": "chicknumber",
+        "weight": "round(weight::numeric, 2)::float8",
+    },
+}
+
+
+def columnar_from_rows(names, rows):
+    """Transpose tuple rows into {name: [values...]} without building a dict per row."""
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
+
+
+def fetch_columnar(conn, table, since=None, window=10, max_rows=1000):
+    """
+    Chart series for `table` as {"t": [...], <column>: [...], "cursor": last id}, oldest first.
+    since=None/<=0 returns the last `window` rows; otherwise rows with id > since (up to max_rows).
+    """
+    exprs = CHART_COLUMNS[table]
+    select = sql.SQL(", ").join(
+        sql.SQL("{} AS {}").format(sql.SQL(expr), sql.Identifier(name)) for name, expr in exprs.items()
+    )
+    with conn.cursor(row_factory=tuple_row) as cur:
+        if not since or since <= 0:
+            cur.execute(
+                sql.SQL("SELECT * FROM (SELECT id, {} FROM {} ORDER BY id DESC LIMIT %s) w ORDER BY id").format(
+                    select, sql.Identifier(table)
+                ),
+                (window,)
+            )
+        else:
+            cur.execute(
+                sql.SQL("SELECT id, {} FROM {} WHERE id > %s ORDER BY id LIMIT %s").format(
+                    select, sql.Identifier(table)
+                ),
+                (since, max_rows)
+            )
+        rows = cur.fetchall()
+    out = columnar_from_rows(["id", *exprs], rows)
+    ids = out.pop("id")
+    out["cursor"] = ids[-1] if ids else max(since or 0, 0)
+    return out